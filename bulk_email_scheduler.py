@@ -15,12 +15,16 @@ This version is cleaned up and prepared for publishing on GitHub.
 import os
 import ssl
 import smtplib
+import atexit
+import collections
+import dataclasses
 import time
 import random
 import datetime
 import sys
 import math
 import socket
+from email import policy as email_policy
 from email.message import EmailMessage
 from email.headerregistry import Address
 
@@ -29,54 +33,15 @@ try:
     HAS_MSVCRT = True
 except ImportError:
     HAS_MSVCRT = False
+    import select
+    import termios
+    import tty
 
 # =======================
-# SMTP configuration
+# Configuration
 # =======================
 
-# Use environment variables in production, default values are only placeholders.
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.example.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
-SMTP_USER = os.getenv("SMTP_USER", "your-address@example.com")
-SMTP_PASS = os.getenv("SMTP_PASS")  # do not hardcode secrets here
-
-FROM_NAME = os.getenv("FROM_NAME", "Content Automation")
-FROM_ADDR = os.getenv("FROM_ADDR", SMTP_USER)
-REPLY_TO = os.getenv("REPLY_TO", FROM_ADDR)
-BCC_DEFAULT = os.getenv("BCC_DEFAULT", "")  # optional default BCC
-
-# =======================
-# Files
-# =======================
-EMAILS_FILE = os.getenv("EMAILS_FILE", "emails.txt")
-SENT_LOG = os.getenv("SENT_LOG", "sent_log.txt")
-
-# =======================
-# Time window and limits
-# =======================
-# Local quiet hours, no sending within this interval
-QUIET_START_HOUR = int(os.getenv("QUIET_START_HOUR", "20"))  # 20:00 local
-QUIET_END_HOUR = int(os.getenv("QUIET_END_HOUR", "7"))       # 07:00 local
-
-# Limits to stay under provider caps and keep a human looking pattern
-MAX_PER_DAY_TOTAL = int(os.getenv("MAX_PER_DAY_TOTAL", "78"))
-MAX_PER_HOUR_TOTAL = int(os.getenv("MAX_PER_HOUR_TOTAL", "12"))
-MAX_PER_DAY_PER_DOMAIN = int(os.getenv("MAX_PER_DAY_PER_DOMAIN", "5"))
-PER_RUN_LIMIT = int(os.getenv("PER_RUN_LIMIT", "999999"))
-
-TEST_ADDRESS = os.getenv("TEST_ADDRESS", FROM_ADDR)
-
-# =======================
-# Email content
-# =======================
-SUBJECT = os.getenv(
-    "EMAIL_SUBJECT",
-    "AI assisted content update for your team"
-)
-
-HTML_BODY = os.getenv(
-    "EMAIL_HTML_BODY",
-    """\
+DEFAULT_HTML_BODY = """\
 <!doctype html>
 <html lang="en">
   <body style="font-family: Arial, Helvetica, sans-serif; color:#111; line-height:1.6; font-size:16px; background-color:#ffffff; margin:0; padding:0;">
@@ -90,20 +55,100 @@ HTML_BODY = os.getenv(
   </body>
 </html>
 """
-)
 
-PLAIN_FALLBACK = os.getenv(
-    "EMAIL_PLAIN_BODY",
-    (
-        "Hello,\n\n"
-        "we use AI assisted content workflows and this email is part of a scheduled batch that shares a new draft article or update.\n\n"
-        "You can treat this message as a starting point, adjust the content to your own voice and context, and then publish it through your usual channels.\n\n"
-        "If you did not expect this message, or if you do not want to receive similar emails in the future, please reply so that we can remove your address from this list.\n\n"
-        "Best regards,\n"
-        "The content automation team\n"
-    ),
+DEFAULT_PLAIN_BODY = (
+    "Hello,\n\n"
+    "we use AI assisted content workflows and this email is part of a scheduled batch that shares a new draft article or update.\n\n"
+    "You can treat this message as a starting point, adjust the content to your own voice and context, and then publish it through your usual channels.\n\n"
+    "If you did not expect this message, or if you do not want to receive similar emails in the future, please reply so that we can remove your address from this list.\n\n"
+    "Best regards,\n"
+    "The content automation team\n"
 )
 
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Config:
+    """
+    All settings of one sender, read once from the environment by
+    from_env. Frozen so a running sender cannot drift from the values
+    it started with, and passed explicitly so two senders with
+    different configs can share a process.
+    """
+
+    # SMTP account. Use environment variables in production, the
+    # defaults are only placeholders. Never hardcode secrets here.
+    smtp_host: str
+    smtp_port: int
+    smtp_user: str
+    smtp_pass: str | None
+
+    from_name: str
+    from_addr: str
+    reply_to: str
+    bcc_default: str  # optional default BCC
+
+    # Files
+    emails_file: str
+    sent_log: str
+
+    # Local quiet hours, no sending within this interval
+    quiet_start_hour: int
+    quiet_end_hour: int
+
+    # Limits to stay under provider caps and keep a human looking pattern
+    max_per_day_total: int
+    max_per_hour_total: int
+    max_per_day_per_domain: int
+    per_run_limit: int
+
+    # Opt in: skip the randomised delays and submit messages back to
+    # back on the persistent connection, but only when the server
+    # advertises PIPELINING (RFC 2920). All caps still apply.
+    burst_mode: bool
+
+    # How often the wait loop wakes up to poll hotkeys, in seconds.
+    poll_interval_sec: float
+
+    test_address: str
+
+    # Email content
+    subject: str
+    html_body: str
+    plain_fallback: str
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        smtp_user = os.getenv("SMTP_USER", "your-address@example.com")
+        from_addr = os.getenv("FROM_ADDR", smtp_user)
+        return cls(
+            smtp_host=os.getenv("SMTP_HOST", "smtp.example.com"),
+            smtp_port=int(os.getenv("SMTP_PORT", "465")),
+            smtp_user=smtp_user,
+            smtp_pass=os.getenv("SMTP_PASS"),
+            from_name=os.getenv("FROM_NAME", "Content Automation"),
+            from_addr=from_addr,
+            reply_to=os.getenv("REPLY_TO", from_addr),
+            bcc_default=os.getenv("BCC_DEFAULT", ""),
+            emails_file=os.getenv("EMAILS_FILE", "emails.txt"),
+            sent_log=os.getenv("SENT_LOG", "sent_log.txt"),
+            quiet_start_hour=int(os.getenv("QUIET_START_HOUR", "20")),  # 20:00 local
+            quiet_end_hour=int(os.getenv("QUIET_END_HOUR", "7")),       # 07:00 local
+            max_per_day_total=int(os.getenv("MAX_PER_DAY_TOTAL", "78")),
+            max_per_hour_total=int(os.getenv("MAX_PER_HOUR_TOTAL", "12")),
+            max_per_day_per_domain=int(os.getenv("MAX_PER_DAY_PER_DOMAIN", "5")),
+            per_run_limit=int(os.getenv("PER_RUN_LIMIT", "999999")),
+            burst_mode=os.getenv("BURST_MODE", "0") == "1",
+            poll_interval_sec=float(os.getenv("POLL_INTERVAL_SEC", "15")),
+            test_address=os.getenv("TEST_ADDRESS", from_addr),
+            subject=os.getenv(
+                "EMAIL_SUBJECT",
+                "AI assisted content update for your team",
+            ),
+            html_body=os.getenv("EMAIL_HTML_BODY", DEFAULT_HTML_BODY),
+            plain_fallback=os.getenv("EMAIL_PLAIN_BODY", DEFAULT_PLAIN_BODY),
+        )
+
+
 # =======================
 # Utilities
 # =======================
@@ -113,91 +158,307 @@ def utc_now_iso() -> str:
     return datetime.datetime.now(datetime.timezone.utc).isoformat()
 
 
-def parse_sent_log(path: str):
-    rows: list[tuple[str, str]] = []
+@dataclasses.dataclass
+class LogStats:
+    """
+    Counters derived from the sent log, kept in memory during a run.
+
+    day_iso and hour_prefix remember which day and hour the counters
+    belong to, so they can be reset in place when the clock crosses a
+    boundary instead of re-reading the log.
+    """
+
+    day_iso: str
+    hour_prefix: str
+    today_total: int = 0
+    hour_total: int = 0
+    used_domains_today: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    already: set[str] = dataclasses.field(default_factory=set)
+
+    def roll_over(self):
+        # One clock read per check: the local day is derived from the
+        # same instant instead of a second today() lookup.
+        now_utc = datetime.datetime.now(datetime.timezone.utc)
+        day_iso = now_utc.astimezone().date().isoformat()
+        hour_prefix = now_utc.strftime("%Y-%m-%dT%H")
+        if day_iso != self.day_iso:
+            self.day_iso = day_iso
+            self.today_total = 0
+            self.used_domains_today.clear()
+        if hour_prefix != self.hour_prefix:
+            self.hour_prefix = hour_prefix
+            self.hour_total = 0
+
+
+def parse_sent_log(path: str) -> LogStats:
+    """
+    Scan the sent log once and return the counters main() needs.
+
+    A single pass replaces the separate today/hour/domain counting
+    passes, and the returned stats are kept up to date in memory by
+    append_sent, so the log never has to be re-read during a run.
+    """
+    now_utc = datetime.datetime.now(datetime.timezone.utc)
+    stats = LogStats(
+        day_iso=now_utc.astimezone().date().isoformat(),
+        hour_prefix=now_utc.strftime("%Y-%m-%dT%H"),
+    )
     if os.path.exists(path):
+        # One read + splitlines beats per-line buffered decoding once
+        # the log has grown to tens of thousands of entries.
         with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                email, *rest = line.split(";")
-                ts = rest[0] if rest else ""
-                rows.append((email.lower(), ts))
-    return rows
+            lines = f.read().splitlines()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            # partition avoids the per-line list that split allocates;
+            # ts is simply "" when a line has no separator.
+            email, _, ts = line.partition(";")
+            # append_sent always writes lowercase, no re-normalizing.
+            stats.already.add(email)
+            if ts.startswith(stats.day_iso):
+                stats.today_total += 1
+                stats.used_domains_today[domain_of(email)] += 1
+            # utc_now_iso always writes UTC ISO timestamps, so a
+            # "YYYY-MM-DDTHH" prefix match is exact and avoids a
+            # fromisoformat round trip per line.
+            if ts.startswith(stats.hour_prefix):
+                stats.hour_total += 1
+    return stats
 
 
-def sent_set(rows):
-    return {r[0] for r in rows}
+def domain_of(addr: str) -> str:
+    # Addresses are normalized to lowercase when the list and the log
+    # are read, so no extra lowercasing here.
+    return addr.split("@")[-1]
 
 
-def domain_of(addr: str) -> str:
-    return addr.split("@")[-1].lower()
+def open_sent_log(path: str):
+    """
+    Open the sent log once for the whole run, line buffered so every
+    record hits the OS right away without re-opening the file per send.
+    """
+    return open(path, "a", encoding="utf-8", buffering=1)
 
 
-def count_today(rows):
-    today = datetime.date.today().isoformat()
-    return sum(1 for _, ts in rows if ts.startswith(today))
+def append_sent(fh, email: str, stats: LogStats):
+    fh.write(f"{email};{utc_now_iso()}\n")
+    # Keep the in-memory counters in sync so the log is write-only
+    # for the rest of the run.
+    stats.already.add(email)
+    stats.today_total += 1
+    stats.hour_total += 1
+    stats.used_domains_today[domain_of(email)] += 1
 
 
-def count_today_domain(rows, dom: str):
-    today = datetime.date.today().isoformat()
-    return sum(1 for em, ts in rows if ts.startswith(today) and domain_of(em) == dom)
+def load_emails(path: str) -> tuple[list[str], list[str], bytearray]:
+    """
+    Load the address list as parallel arrays: lowercased addresses,
+    their domains, and one eligibility flag per index (1 = still a
+    candidate). Lowercasing, deduplication and domain extraction happen
+    once here instead of on every selection pass over the list.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found.")
+    addrs_lower: list[str] = []
+    domains: list[str] = []
+    seen: set[str] = set()
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        a = line.strip()
+        if a and "@" in a:
+            low = a.lower()
+            if low in seen:
+                continue
+            seen.add(low)
+            addrs_lower.append(low)
+            domains.append(domain_of(low))
+    active = bytearray(b"\x01" * len(addrs_lower))
+    return addrs_lower, domains, active
+
+
+class SmtpSession:
+    """
+    Persistent SMTP connection, reused across sends.
 
+    TLS handshake and LOGIN happen once per session instead of once per
+    message. After long waits the socket may have gone stale, so
+    get_server checks the connection with NOOP and reconnects lazily.
+    """
 
-def count_this_hour(rows):
-    now = datetime.datetime.now(datetime.timezone.utc)
-    y, m, d, h = now.year, now.month, now.day, now.hour
+    def __init__(self, cfg: Config):
+        self._cfg = cfg
+        self._server: smtplib.SMTP_SSL | None = None
 
-    def within_hour(ts):
+    def _connect(self) -> smtplib.SMTP_SSL:
+        cfg = self._cfg
+        if not cfg.smtp_pass:
+            raise RuntimeError("SMTP_PASS environment variable is not set.")
+        ctx = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(cfg.smtp_host, cfg.smtp_port, context=ctx, timeout=60)
         try:
-            t = datetime.datetime.fromisoformat(ts)
-            t = t.astimezone(datetime.timezone.utc)
-            return (t.year, t.month, t.day, t.hour) == (y, m, d, h)
+            server.login(cfg.smtp_user, cfg.smtp_pass)
         except Exception:
-            return False
+            try:
+                server.close()
+            except Exception:
+                pass
+            raise
+        return server
+
+    def get_server(self) -> smtplib.SMTP_SSL:
+        if self._server is not None:
+            try:
+                self._server.noop()
+                return self._server
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                self.close()
+        self._server = self._connect()
+        return self._server
+
+    def supports_pipelining(self) -> bool:
+        """Whether the connected server advertised PIPELINING in EHLO."""
+        return self._server is not None and "pipelining" in self._server.esmtp_features
+
+    def reset(self):
+        """Clear a half-finished transaction after a failed send."""
+        if self._server is not None:
+            try:
+                self._server.rset()
+            except Exception:
+                pass
 
-    return sum(1 for _, ts in rows if within_hour(ts))
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
 
+    def __enter__(self):
+        return self
 
-def append_sent(path: str, email: str):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(f"{email.lower()};{utc_now_iso()}\n")
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
-def load_emails(path: str):
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"{path} not found.")
-    emails: list[str] = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            a = line.strip()
-            if a and "@" in a:
-                emails.append(a)
-    return emails
+# =======================
+# State
+# =======================
+
+
+class State:
+    """
+    Mutable runtime state of one sender: the operator toggles, the
+    cached SMTP session, and the per-run caches derived from the
+    config. Slotted so hot-path attribute reads stay cheap and typos
+    cannot create stray attributes.
+    """
+
+    __slots__ = ("bcc_on", "session", "template_msg", "raw_parts", "net_last_ok")
+
+    def __init__(self):
+        self.bcc_on: bool = True
+        self.session: SmtpSession | None = None
+        self.template_msg: EmailMessage | None = None
+        self.raw_parts: tuple[bytes, bytes] | None = None
+        # Monotonic timestamp of the last successful connectivity
+        # probe. Failures are never cached.
+        self.net_last_ok: float = -math.inf
+
+
+def get_server(cfg: Config, state: State) -> smtplib.SMTP_SSL:
+    """Return a healthy SMTP server from the session cached on the state."""
+    if state.session is None:
+        state.session = SmtpSession(cfg)
+    return state.session.get_server()
 
 
-def build_message(to_addr: str, bcc_on: bool = True) -> EmailMessage:
+# =======================
+# Message building
+# =======================
+
+
+def _build_template(cfg: Config) -> EmailMessage:
     msg = EmailMessage()
-    msg["Subject"] = SUBJECT
-    msg["From"] = Address(FROM_NAME, addr_spec=FROM_ADDR)
-    msg["To"] = to_addr
-    msg["Reply-To"] = REPLY_TO
-    if bcc_on and BCC_DEFAULT:
-        msg["Bcc"] = BCC_DEFAULT
+    msg["Subject"] = cfg.subject
+    msg["From"] = Address(cfg.from_name, addr_spec=cfg.from_addr)
+    msg["Reply-To"] = cfg.reply_to
     msg["X-Content-Automation"] = "yes"
-    msg.set_content(PLAIN_FALLBACK, subtype="plain", charset="utf-8")
-    msg.add_alternative(HTML_BODY, subtype="html", charset="utf-8")
+    msg.set_content(cfg.plain_fallback, subtype="plain", charset="utf-8")
+    msg.add_alternative(cfg.html_body, subtype="html", charset="utf-8")
     return msg
 
 
-def smtp_send_one(msg: EmailMessage):
-    if not SMTP_PASS:
-        raise RuntimeError("SMTP_PASS environment variable is not set.")
-    ctx = ssl.create_default_context()
-    with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ctx, timeout=60) as server:
-        server.login(SMTP_USER, SMTP_PASS)
-        server.send_message(msg)
+def build_message(cfg: Config, state: State, to_addr: str, bcc_on: bool = True) -> EmailMessage:
+    """
+    Return the shared template with To and Bcc swapped for this send.
+
+    Subject, From, Reply-To and both body parts are constant for the
+    whole run, so the multipart message is built once and cached on the
+    state. The template is reused in place rather than shallow-copied,
+    because a shallow copy would still share the header list with the
+    template. The sender is single threaded and the message is consumed
+    before the next call, so in-place reuse is safe.
+    """
+    if state.template_msg is None:
+        state.template_msg = _build_template(cfg)
+    msg = state.template_msg
+    del msg["To"]
+    del msg["Bcc"]
+    msg["To"] = to_addr
+    if bcc_on and cfg.bcc_default:
+        msg["Bcc"] = cfg.bcc_default
+    return msg
+
+
+# The serialized message only differs in the To header between sends,
+# so the bytes before and after it are cached and spliced per call.
+_TO_PLACEHOLDER = "to-placeholder@invalid"
+
+
+def _raw_parts(cfg: Config, state: State) -> tuple[bytes, bytes]:
+    """
+    Serialize the template once and split it around the To header.
+
+    Bcc never appears in the serialized bytes (send_message strips it
+    as well); BCC recipients go on the SMTP envelope instead, so a
+    single cached variant covers both toggle states.
+    """
+    if state.raw_parts is None:
+        raw = build_message(cfg, state, _TO_PLACEHOLDER, bcc_on=False).as_bytes(
+            policy=email_policy.SMTP
+        )
+        marker = f"To: {_TO_PLACEHOLDER}\r\n".encode("ascii")
+        head, sep, tail = raw.partition(marker)
+        if not sep:
+            raise RuntimeError("To header not found in serialized template.")
+        state.raw_parts = (head, tail)
+    return state.raw_parts
+
+
+def bcc_addresses(cfg: Config) -> list[str]:
+    return [a.strip() for a in cfg.bcc_default.split(",") if a.strip()]
+
+
+def smtp_send_one(
+    cfg: Config,
+    state: State,
+    server: smtplib.SMTP_SSL,
+    to_addr: str,
+    bcc_on: bool = True,
+):
+    head, tail = _raw_parts(cfg, state)
+    rcpts = [to_addr]
+    if bcc_on and cfg.bcc_default:
+        rcpts.extend(bcc_addresses(cfg))
+    data = head + f"To: {to_addr}\r\n".encode("ascii") + tail
+    server.sendmail(cfg.from_addr, rcpts, data)
 
 
 # =======================
@@ -205,58 +466,132 @@ def smtp_send_one(msg: EmailMessage):
 # =======================
 
 
-def has_connectivity(timeout_sec: float = 5.0) -> bool:
+def reset_connectivity_cache(state: State):
+    """Forget the last successful probe, e.g. after a send error."""
+    state.net_last_ok = -math.inf
+
+
+def has_connectivity(
+    cfg: Config,
+    state: State,
+    timeout_sec: float = 5.0,
+    max_age_sec: float = 5.0,
+) -> bool:
+    """
+    True when the SMTP host (or a public resolver as fallback) is
+    reachable. A success is reused for max_age_sec so back-to-back
+    checks do not each open a throwaway TCP connection; failures are
+    never cached, so an offline wait loop keeps probing.
+    """
+    if time.monotonic() - state.net_last_ok < max_age_sec:
+        return True
     try:
-        with socket.create_connection((SMTP_HOST, SMTP_PORT), timeout=timeout_sec):
+        with socket.create_connection((cfg.smtp_host, cfg.smtp_port), timeout=timeout_sec):
+            state.net_last_ok = time.monotonic()
             return True
     except Exception:
         pass
     try:
         with socket.create_connection(("8.8.8.8", 53), timeout=timeout_sec):
+            state.net_last_ok = time.monotonic()
             return True
     except Exception:
         return False
 
 
-def _hotkey_loop(prompt: str, during_wait: bool = False) -> bool:
+_keyboard_ready = False
+_saved_termios = None
+_last_prompt: str | None = None
+
+
+def _init_keyboard():
+    """
+    Prepare per-keypress input. msvcrt handles this on Windows; on
+    POSIX the terminal is switched to cbreak mode once and restored at
+    exit. Without a terminal (piped stdin, cron) hotkeys stay disabled
+    and the script just keeps running.
+    """
+    global _keyboard_ready, _saved_termios
+    if HAS_MSVCRT:
+        _keyboard_ready = True
+        return
+    try:
+        if not sys.stdin.isatty():
+            return
+        fd = sys.stdin.fileno()
+        _saved_termios = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+    except Exception:
+        return
+    atexit.register(_restore_keyboard)
+    _keyboard_ready = True
+
+
+def _restore_keyboard():
+    if _saved_termios is not None:
+        try:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, _saved_termios)
+        except Exception:
+            pass
+
+
+def _pending_keys():
+    """Yield pressed keys lowercased, without blocking."""
+    if HAS_MSVCRT:
+        while msvcrt.kbhit():
+            yield msvcrt.getwch().lower()
+    else:
+        while select.select([sys.stdin], [], [], 0)[0]:
+            ch = sys.stdin.read(1)
+            if not ch:
+                return
+            yield ch.lower()
+
+
+def _hotkey_loop(cfg: Config, state: State, prompt: str, during_wait: bool = False) -> bool:
     """
-    Windows only:
     - q quits the script
     - t sends a test email
     - o toggles default BCC on or off
     """
-    if not HAS_MSVCRT:
-        # On non Windows systems we ignore hotkeys and keep running.
+    global _last_prompt
+    if not _keyboard_ready:
         return True
-    if during_wait:
+    if during_wait and prompt != _last_prompt:
+        # Only repaint the status line when it actually changes.
         print(prompt, end="\r", flush=True)
-    while msvcrt.kbhit():
-        ch = msvcrt.getwch().lower()
+        _last_prompt = prompt
+    for ch in _pending_keys():
         if ch == "q":
             print("\n[ABORT]")
             return False
         if ch == "t":
             try:
-                if not has_connectivity():
+                if not has_connectivity(cfg, state):
                     print("\n[NET] offline, cannot send test email now.")
                 else:
-                    smtp_send_one(build_message(TEST_ADDRESS, State.bcc_on))
+                    smtp_send_one(
+                        cfg, state, get_server(cfg, state), cfg.test_address, state.bcc_on
+                    )
                     print("\n[OK] test email sent.")
             except Exception as e:
                 print(f"\n[ERR] test email: {e}")
         if ch == "o":
-            State.bcc_on = not State.bcc_on
-            print(f"\n[BCC] {'on' if State.bcc_on else 'off'}")
+            state.bcc_on = not state.bcc_on
+            print(f"\n[BCC] {'on' if state.bcc_on else 'off'}")
+        _last_prompt = None  # output scrolled, repaint the prompt next time
     return True
 
 
 def wait_for_connectivity(
+    cfg: Config,
+    state: State,
     status_hint: str = "[NET] offline, waiting for connectivity. t=test, q=quit, o=BCC toggle",
 ) -> bool:
     while True:
-        if has_connectivity():
+        if has_connectivity(cfg, state):
             return True
-        _hotkey_loop(status_hint, during_wait=True)
+        _hotkey_loop(cfg, state, status_hint, during_wait=True)
         time.sleep(2.0)
 
 
@@ -265,49 +600,64 @@ def wait_for_connectivity(
 # =======================
 
 
-def in_quiet_hours(dt_local: datetime.datetime) -> bool:
+def in_quiet_hours(cfg: Config, dt_local: datetime.datetime) -> bool:
     h = dt_local.hour
-    return (h >= QUIET_START_HOUR) or (h < QUIET_END_HOUR)
+    return (h >= cfg.quiet_start_hour) or (h < cfg.quiet_end_hour)
 
 
-def wait_until(target_local: datetime.datetime) -> bool:
+def wait_until(cfg: Config, state: State, target_local: datetime.datetime) -> bool:
+    # The wall-clock target is converted to a monotonic deadline once,
+    # so a system clock jump can neither stall the sender nor collapse
+    # the schedule.
+    deadline = time.monotonic() + (
+        target_local - datetime.datetime.now()
+    ).total_seconds()
     while True:
-        now = datetime.datetime.now()
-        if now >= target_local:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
             return True
         if not _hotkey_loop(
+            cfg,
+            state,
             "[WAIT] q=quit, t=test, o=BCC toggle",
             during_wait=True,
         ):
             return False
-        remaining = (target_local - now).total_seconds()
-        time.sleep(min(remaining, 15.0))
+        time.sleep(min(remaining, cfg.poll_interval_sec))
 
 
 def next_start_of_day_at(hour: int, minute: int = 0) -> datetime.datetime:
     now = datetime.datetime.now()
-    day = now.date()
+    start = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
     if now.hour >= hour:
-        day = day + datetime.timedelta(days=1)
-    return datetime.datetime.combine(
-        day,
-        datetime.time(hour=hour, minute=minute, second=0),
-    )
+        start += datetime.timedelta(days=1)
+    return start
 
 
-def ensure_business_window():
+def ensure_business_window(cfg: Config, state: State):
     now = datetime.datetime.now()
-    if in_quiet_hours(now):
-        start = next_start_of_day_at(QUIET_END_HOUR, 0)
+    if in_quiet_hours(cfg, now):
+        start = next_start_of_day_at(cfg.quiet_end_hour, 0)
         print(
             "[INFO] quiet hours active, next start at "
             f"{start.strftime('%Y-%m-%d %H:%M')}. q=quit, t=test, o=BCC toggle"
         )
-        ok = wait_until(start)
+        ok = wait_until(cfg, state, start)
         if not ok:
             sys.exit(0)
 
 
+# Delay distribution parameters as (lo, hi, mu, sigma), precomputed for
+# business hours and other times. mu = ln(mean) - sigma^2 / 2 so that the
+# log normal mean comes out at 32 and 75 minutes respectively.
+_DELAY_BUSINESS = (22, 45, math.log(32) - (0.40 ** 2) / 2, 0.40)
+_DELAY_OFF_HOURS = (55, 100, math.log(75) - (0.40 ** 2) / 2, 0.40)
+
+# Dedicated generator so sampling does not go through the shared global
+# random instance.
+_rng = random.Random()
+
+
 def biased_delay_minutes(now_local: datetime.datetime) -> int:
     """
     Sample a delay in minutes from a log normal distribution, with different
@@ -317,59 +667,81 @@ def biased_delay_minutes(now_local: datetime.datetime) -> int:
     """
     h = now_local.hour
     if 9 <= h < 12 or 14 <= h < 17:
-        lo, hi = 22, 45
-        mean = 32
-        sigma = 0.40
+        lo, hi, mu, sigma = _DELAY_BUSINESS
     else:
-        lo, hi = 55, 100
-        mean = 75
-        sigma = 0.40
-    mu = math.log(mean) - (sigma ** 2) / 2
-    x = random.lognormvariate(mu, sigma)
-    val = int(max(lo, min(hi, round(x))))
-    val += random.randint(0, 5)
+        lo, hi, mu, sigma = _DELAY_OFF_HOURS
+    x = _rng.lognormvariate(mu, sigma)
+    val = min(hi, max(lo, int(x + 0.5)))
+    val += _rng.randint(0, 5)
     return val
 
 
-def schedule_next(now_local: datetime.datetime, base_delay_min: int) -> datetime.datetime:
+def schedule_next(
+    cfg: Config, now_local: datetime.datetime, base_delay_min: int
+) -> datetime.datetime:
     target = now_local + datetime.timedelta(minutes=base_delay_min)
-    if in_quiet_hours(target):
-        day = target.date()
-        if target.hour >= QUIET_START_HOUR:
-            day = day + datetime.timedelta(days=1)
-        target = datetime.datetime.combine(
-            day,
-            datetime.time(hour=QUIET_END_HOUR, minute=0, second=0),
+    if in_quiet_hours(cfg, target):
+        if target.hour >= cfg.quiet_start_hour:
+            target += datetime.timedelta(days=1)
+        target = target.replace(
+            hour=cfg.quiet_end_hour, minute=0, second=0, microsecond=0
         )
-    target += datetime.timedelta(seconds=random.randint(5, 45))
+    target += datetime.timedelta(seconds=_rng.randint(5, 45))
     return target
 
 
-def first_unsent_rotating(
-    emails: list[str],
-    already_sent: set[str],
-    used_domains_today: dict[str, int],
+def build_domain_queues(
+    cfg: Config,
+    domains: list[str],
+    active: bytearray,
+    used_domains_today: collections.Counter[str],
+) -> tuple[dict[str, collections.deque[int]], collections.deque[str]]:
+    """
+    Bucket the eligible address indices by domain and build a rotation
+    ring of domains that still have quota, so selection pops from the
+    queues instead of scanning the whole address list per send.
+    """
+    by_domain: dict[str, collections.deque[int]] = {}
+    for i, flag in enumerate(active):
+        if flag:
+            by_domain.setdefault(domains[i], collections.deque()).append(i)
+    domains_ring = collections.deque(
+        dom
+        for dom, queue in by_domain.items()
+        if queue and used_domains_today[dom] < cfg.max_per_day_per_domain
+    )
+    return by_domain, domains_ring
+
+
+def next_unsent_rotating(
+    cfg: Config,
+    by_domain: dict[str, collections.deque[int]],
+    domains_ring: collections.deque[str],
+    used_domains_today: collections.Counter[str],
     last_domain: str | None,
-    failed_once: set[str],
-) -> str | None:
+) -> int | None:
     """
-    Choose the next address that has not been sent to, avoids domains that hit
-    the per day cap, and tries to rotate domains so that successive sends
-    come from different domains when possible.
+    Pop the index of the next eligible address, preferring a different
+    domain than the previous send. Domains with an empty queue or a
+    reached per day cap drop out of the ring; a domain with work left
+    is appended back, which gives the rotation.
     """
-    candidate_any: str | None = None
-    for addr in emails:
-        low = addr.lower()
-        if low in already_sent or low in failed_once:
+    rotated = False
+    while domains_ring:
+        dom = domains_ring.popleft()
+        queue = by_domain.get(dom)
+        if not queue or used_domains_today[dom] >= cfg.max_per_day_per_domain:
             continue
-        dom = domain_of(low)
-        if used_domains_today.get(dom, 0) >= MAX_PER_DAY_PER_DOMAIN:
+        if dom == last_domain and domains_ring and not rotated:
+            # Push the previous domain to the back and try the next one.
+            domains_ring.append(dom)
+            rotated = True
             continue
-        if last_domain and dom != last_domain:
-            return low
-        if candidate_any is None:
-            candidate_any = low
-    return candidate_any
+        idx = queue.popleft()
+        if queue:
+            domains_ring.append(dom)
+        return idx
+    return None
 
 
 # =======================
@@ -397,149 +769,184 @@ def is_soft_error(err: Exception) -> bool:
     return False
 
 
-# =======================
-# State
-# =======================
-
-
-class State:
-    bcc_on = True
-
-
 # =======================
 # Main
 # =======================
 
 
-def main():
+def main(cfg: Config, state: State):
+    _init_keyboard()
+
     # Direct test mode, send a single test email and exit.
     if len(sys.argv) > 1 and sys.argv[1] == "--test":
-        if not has_connectivity():
+        if not has_connectivity(cfg, state):
             print("[NET] offline, waiting before sending test email...")
-            if not wait_for_connectivity():
+            if not wait_for_connectivity(cfg, state):
                 return
         try:
-            smtp_send_one(build_message(TEST_ADDRESS, State.bcc_on))
+            smtp_send_one(cfg, state, get_server(cfg, state), cfg.test_address, state.bcc_on)
             print("[OK] test email sent.")
         except Exception as e:
             print("[ERR] test email:", e)
+        finally:
+            if state.session is not None:
+                state.session.close()
+                state.session = None
         return
 
-    sent_rows = parse_sent_log(SENT_LOG)
-    already = sent_set(sent_rows)
-    emails = load_emails(EMAILS_FILE)
-
-    today_total = count_today(sent_rows)
-    hour_total = count_this_hour(sent_rows)
+    stats = parse_sent_log(cfg.sent_log)
+    addrs_lower, domains, active = load_emails(cfg.emails_file)
 
-    used_domains_today: dict[str, int] = {}
-    for em, ts in sent_rows:
-        if ts.startswith(datetime.date.today().isoformat()):
-            d = domain_of(em)
-            used_domains_today[d] = used_domains_today.get(d, 0) + 1
+    # Addresses already in the log are not eligible this run.
+    for i, a in enumerate(addrs_lower):
+        if a in stats.already:
+            active[i] = 0
 
-    if today_total >= MAX_PER_DAY_TOTAL:
-        print(f"[INFO] daily limit reached: {today_total}/{MAX_PER_DAY_TOTAL}.")
+    if stats.today_total >= cfg.max_per_day_total:
+        print(f"[INFO] daily limit reached: {stats.today_total}/{cfg.max_per_day_total}.")
         return
 
     # No night starts
-    ensure_business_window()
+    ensure_business_window(cfg, state)
 
-    if not has_connectivity():
+    if not has_connectivity(cfg, state):
         print("[NET] offline, waiting for connection...")
-        if not wait_for_connectivity():
+        if not wait_for_connectivity(cfg, state):
             return
 
     sent_count = 0
-    limit = PER_RUN_LIMIT
+    limit = cfg.per_run_limit
     last_domain: str | None = None
-    failed_once: set[str] = set()
 
-    while sent_count < limit and today_total < MAX_PER_DAY_TOTAL:
-        if hour_total >= MAX_PER_HOUR_TOTAL:
-            now = datetime.datetime.now()
-            next_hour = (now + datetime.timedelta(hours=1)).replace(
-                minute=0, second=0, microsecond=0
-            )
-            print(
-                "[INFO] hourly cap reached: "
-                f"{hour_total}/{MAX_PER_HOUR_TOTAL}. "
-                f"Next run at {next_hour.strftime('%Y-%m-%d %H:%M')}. "
-                "q=quit, t=test, o=BCC toggle"
-            )
-            if not wait_until(next_hour):
+    by_domain, domains_ring = build_domain_queues(
+        cfg, domains, active, stats.used_domains_today
+    )
+    ring_day = stats.day_iso
+
+    session = SmtpSession(cfg)
+    state.session = session
+    log_fh = open_sent_log(cfg.sent_log)
+    try:
+        while sent_count < limit and stats.today_total < cfg.max_per_day_total:
+            stats.roll_over()
+            if stats.day_iso != ring_day:
+                # Per-domain quotas reset at midnight, so domains that
+                # dropped out of the ring become eligible again.
+                by_domain, domains_ring = build_domain_queues(
+                    cfg, domains, active, stats.used_domains_today
+                )
+                ring_day = stats.day_iso
+            if stats.hour_total >= cfg.max_per_hour_total:
+                now = datetime.datetime.now()
+                next_hour = (now + datetime.timedelta(hours=1)).replace(
+                    minute=0, second=0, microsecond=0
+                )
+                print(
+                    "[INFO] hourly cap reached: "
+                    f"{stats.hour_total}/{cfg.max_per_hour_total}. "
+                    f"Next run at {next_hour.strftime('%Y-%m-%d %H:%M')}. "
+                    "q=quit, t=test, o=BCC toggle"
+                )
+                if not wait_until(cfg, state, next_hour):
+                    break
+                # roll_over at the top of the loop resets the hour counter.
+                continue
+
+            if not _hotkey_loop(
+                cfg, state, "[READY] t=test, q=quit, o=BCC toggle", during_wait=False
+            ):
                 break
-            if not has_connectivity() and not wait_for_connectivity():
+
+            # get_server NOOPs the cached session, so a healthy session
+            # doubles as the connectivity probe; no separate TCP
+            # handshake runs per send. The server is acquired before an
+            # address is taken off the queues, so nothing is consumed
+            # while offline.
+            try:
+                server = get_server(cfg, state)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                reset_connectivity_cache(state)
+                print("[NET] offline, waiting for connection...")
+                if not wait_for_connectivity(cfg, state):
+                    break
+                continue
+            except smtplib.SMTPException as e:
+                # Authentication and other protocol failures will not go
+                # away by retrying with the next address.
+                print(f"[ERR] SMTP session: {e}")
                 break
-            sent_rows = parse_sent_log(SENT_LOG)
-            hour_total = count_this_hour(sent_rows)
-            continue
 
-        addr = first_unsent_rotating(
-            emails,
-            already,
-            used_domains_today,
-            last_domain,
-            failed_once,
-        )
-        if not addr:
-            print(
-                "[INFO] nothing left to send. "
-                "All addresses processed or domain limits reached."
+            idx = next_unsent_rotating(
+                cfg,
+                by_domain,
+                domains_ring,
+                stats.used_domains_today,
+                last_domain,
             )
-            break
-
-        if not _hotkey_loop("[READY] t=test, q=quit, o=BCC toggle", during_wait=False):
-            break
+            if idx is None:
+                print(
+                    "[INFO] nothing left to send. "
+                    "All addresses processed or domain limits reached."
+                )
+                break
+            addr = addrs_lower[idx]
 
-        if not has_connectivity():
-            print("[NET] offline, waiting for connection...")
-            if not wait_for_connectivity():
+            try:
+                try:
+                    smtp_send_one(cfg, state, server, addr, state.bcc_on)
+                except (
+                    smtplib.SMTPServerDisconnected,
+                    smtplib.SMTPConnectError,
+                    socket.error,
+                ):
+                    # Stale connection after a long wait, reconnect and retry once.
+                    session.close()
+                    smtp_send_one(cfg, state, get_server(cfg, state), addr, state.bcc_on)
+                print(
+                    f"[OK] sent: {addr}  "
+                    f"{'(bcc on)' if state.bcc_on else '(bcc off)'}"
+                )
+                append_sent(log_fh, addr, stats)  # log on success only
+                active[idx] = 0
+                last_domain = domains[idx]
+                sent_count += 1
+            except Exception as e:
+                print(f"[ERR] {addr}: {e}")
+                active[idx] = 0  # do not retry failed addresses in this run
+                last_domain = domains[idx]
+                session.reset()
+                reset_connectivity_cache(state)
+                # No waiting here, go straight to the next address.
+
+            if stats.today_total >= cfg.max_per_day_total:
+                print(
+                    f"[INFO] daily limit reached: {stats.today_total}/{cfg.max_per_day_total}. Stop."
+                )
                 break
 
-        try:
-            smtp_send_one(build_message(addr, State.bcc_on))
-            print(
-                f"[OK] sent: {addr}  "
-                f"{'(bcc on)' if State.bcc_on else '(bcc off)'}"
-            )
-            append_sent(SENT_LOG, addr)  # log on success only
-            already.add(addr.lower())
-            d = domain_of(addr)
-            used_domains_today[d] = used_domains_today.get(d, 0) + 1
-            last_domain = d
-            sent_count += 1
-            today_total += 1
-            hour_total += 1
-        except Exception as e:
-            print(f"[ERR] {addr}: {e}")
-            failed_once.add(addr.lower())
-            last_domain = domain_of(addr)
-            # No waiting here, go straight to the next address.
+            if cfg.burst_mode and session.supports_pipelining():
+                # Burst mode: submit the next message right away on the
+                # pipelined connection; the caps at the top of the loop
+                # still gate the pace.
+                continue
 
-        if today_total >= MAX_PER_DAY_TOTAL:
+            now_local = datetime.datetime.now()
+            base_delay = biased_delay_minutes(now_local)
+            target = schedule_next(cfg, now_local, base_delay)
             print(
-                f"[INFO] daily limit reached: {today_total}/{MAX_PER_DAY_TOTAL}. Stop."
+                f"[PLAN] next send at "
+                f"{target.strftime('%Y-%m-%d %H:%M')}. "
+                "q=quit, t=test, o=BCC toggle"
             )
-            break
-
-        now_local = datetime.datetime.now()
-        base_delay = biased_delay_minutes(now_local)
-        target = schedule_next(now_local, base_delay)
-        print(
-            f"[PLAN] next send at "
-            f"{target.strftime('%Y-%m-%d %H:%M')}. "
-            "q=quit, t=test, o=BCC toggle"
-        )
-        if not wait_until(target):
-            break
-        if not has_connectivity():
-            print("[NET] offline, waiting for connection...")
-            if not wait_for_connectivity():
+            if not wait_until(cfg, state, target):
                 break
+    finally:
+        log_fh.close()
+        session.close()
+        state.session = None
 
     print(f"[DONE] sent: {sent_count} emails.")
 
 
 if __name__ == "__main__":
-    main()
+    main(Config.from_env(), State())